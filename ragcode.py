@@ -10,6 +10,11 @@ from fastapi import FastAPI
 from pydantic import BaseModel
 
 import os
+import shutil
+import tempfile
+import time
+import hashlib
+from functools import lru_cache
 from dotenv import load_dotenv
 import getpass
 load_dotenv()
@@ -19,16 +24,83 @@ if "GOOGLE_API_KEY" not in os.environ:
 print("Setting up RAG system...")
 
 CSV_PATH = "C:/Users/Seshagiri/Desktop/Handson/mcp-server-demo/iris.csv"
-loader = CSVLoader(file_path=CSV_PATH)
-documents = loader.load()
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+STALE_TMP_SECONDS = 60 * 60
 
-# Split documents
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-docs = text_splitter.split_documents(documents)
+# Key the saved index on everything it is built from, so changing the data,
+# the embedding model or the splitter settings triggers a rebuild
+index_hash = hashlib.blake2b(f"{EMBEDDING_MODEL}|{CHUNK_SIZE}|{CHUNK_OVERLAP}|".encode(), digest_size=16)
+with open(CSV_PATH, "rb") as f:
+    index_hash.update(f.read())
+INDEX_KEY = index_hash.hexdigest()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_ROOT = os.path.join(BASE_DIR, "faiss_index")
+INDEX_PATH = os.path.join(INDEX_ROOT, INDEX_KEY)
 
-print("Creating embeddings...")
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-vectorstore = FAISS.from_documents(docs, embedding_model)
+embedding_model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+
+def index_is_complete(path):
+    """True when both files written by FAISS.save_local exist under path."""
+    return all(os.path.isfile(os.path.join(path, name)) for name in ("index.faiss", "index.pkl"))
+
+def build_vectorstore(replace_existing=False):
+    """Embeds the CSV into a new FAISS index and saves it to INDEX_PATH.
+    A complete index already at INDEX_PATH (e.g. saved by another worker
+    meanwhile) is kept unless replace_existing is set."""
+    loader = CSVLoader(file_path=CSV_PATH)
+    documents = loader.load()
+
+    # Split documents
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    docs = text_splitter.split_documents(documents)
+
+    print("Creating embeddings...")
+    vectorstore = FAISS.from_documents(docs, embedding_model)
+
+    # Save into a temp dir and swap it in, so a killed run never leaves a half-written index
+    os.makedirs(INDEX_ROOT, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=INDEX_ROOT)
+    try:
+        vectorstore.save_local(tmp_path)
+        if replace_existing or not index_is_complete(INDEX_PATH):
+            shutil.rmtree(INDEX_PATH, ignore_errors=True)
+        try:
+            os.replace(tmp_path, INDEX_PATH)
+        except OSError:
+            # Another worker published this index first; keep theirs on disk and ours in memory
+            print("Index already saved by another process, keeping it")
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    # Drop indexes built from older inputs and temp dirs left by killed runs.
+    # Recent temp dirs may belong to another worker that is still saving.
+    for name in os.listdir(INDEX_ROOT):
+        path = os.path.join(INDEX_ROOT, name)
+        if name == INDEX_KEY:
+            continue
+        if name.startswith(".tmp-"):
+            try:
+                if time.time() - os.path.getmtime(path) < STALE_TMP_SECONDS:
+                    continue
+            except OSError:
+                continue
+        shutil.rmtree(path, ignore_errors=True)
+    return vectorstore
+
+vectorstore = None
+if index_is_complete(INDEX_PATH):
+    # Reuse the index saved by a previous run instead of re-embedding the CSV.
+    # load_local unpickles index.pkl, so faiss_index/ must only be writable by trusted users.
+    print("Loading saved index...")
+    try:
+        vectorstore = FAISS.load_local(INDEX_PATH, embedding_model, allow_dangerous_deserialization=True)
+    except Exception as e:
+        print(f"Saved index could not be loaded ({e}), rebuilding...")
+        vectorstore = build_vectorstore(replace_existing=True)
+if vectorstore is None:
+    vectorstore = build_vectorstore()
 
 retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
 llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.1)
@@ -41,16 +113,23 @@ app=FastAPI()
 class QueryRequest(BaseModel):
     question:str
 
-@app.post("/ask")
-def ask_question(request:QueryRequest):
-    """Receives a question, processes it through the RAG chain, 
-    and returns the answer and source documents."""
-    response = qa_chain.invoke(request.question)
+@lru_cache(maxsize=256)
+def _cached_answer(question:str):
+    """Runs the RAG chain once per distinct question. The cached value is only
+    read by answer_question, which hands callers fresh copies."""
+    response = qa_chain.invoke(question)
     answer = response.get("result")
     source_documents=response.get("source_documents",[])
+    return answer, tuple((doc.page_content, dict(doc.metadata)) for doc in source_documents)
+
+def answer_question(question:str):
+    """Processes a question through the RAG chain and returns the answer
+    and source documents. Independent of FastAPI so it can be reused in batch.
+    Repeated questions are served from an in-process cache instead of the LLM."""
+    answer, sources = _cached_answer(question)
     
     clean_sources = [
-        {"content": doc.page_content, "metadata": doc.metadata} for doc in source_documents
+        {"content": content, "metadata": dict(metadata)} for content, metadata in sources
     ]
     
     return {
@@ -58,3 +137,8 @@ def ask_question(request:QueryRequest):
         "source_documents": clean_sources
     }
 
+
+@app.post("/ask")
+def ask_question(request:QueryRequest):
+    """Receives a question and returns the RAG chain's answer and source documents."""
+    return answer_question(request.question)